@@ -2,10 +2,16 @@ import discord
 from discord.ext import commands
 import asyncio
 import json
+import logging
 import os
 import sys
 from dotenv import load_dotenv
 
+try:
+    import uvloop  # Faster event loop, not available on Windows
+except ImportError:
+    uvloop = None
+
 from database import Database, load_database_config
 from commands.config import setup as setup_config_commands
 from commands.shuffle import setup as setup_shuffle_commands
@@ -13,6 +19,9 @@ from commands.shuffle import setup as setup_shuffle_commands
 # Load environment variables from .env file if it exists
 load_dotenv()
 
+# Bot token, loaded once by load_bot_token()
+_token_cache = None
+
 class RoleShufflerBot(commands.Bot):
     def __init__(self):
         # Define intents - what the bot needs permission to see/do
@@ -29,6 +38,12 @@ class RoleShufflerBot(commands.Bot):
         
         self.database = None
 
+        # Server joins/leaves waiting to be written to the database, as
+        # (guild_id, guild_name or None for a leave), and the task writing them.
+        # A bare None tells the task to stop.
+        self._server_ops = asyncio.Queue()
+        self._server_worker = None
+
     async def setup_hook(self):
         """This is called when the bot is starting up."""
         print("🤖 Starting Role Shuffler Bot...")
@@ -44,10 +59,15 @@ class RoleShufflerBot(commands.Bot):
             await self.close()
             return
 
-        # Load command modules (cogs)
+        # Write server joins/leaves to the database in the background
+        self._server_worker = asyncio.create_task(self._drain_server_ops())
+
+        # Load command modules (cogs) - they don't depend on each other
         try:
-            await setup_config_commands(self, self.database)
-            await setup_shuffle_commands(self, self.database)
+            await asyncio.gather(
+                setup_config_commands(self, self.database),
+                setup_shuffle_commands(self, self.database)
+            )
             print("✅ Commands loaded successfully")
         except Exception as e:
             print(f"❌ Failed to load commands: {e}")
@@ -65,6 +85,11 @@ class RoleShufflerBot(commands.Bot):
         """Called when the bot is ready and connected."""
         print(f"🎉 {self.user} is now online!")
         print(f"📊 Connected to {len(self.guilds)} servers")
+
+        # Make sure every server we're in is stored (written as one batch)
+        if self._server_worker:
+            for guild in self.guilds:
+                self._server_ops.put_nowait((guild.id, guild.name))
         
         # Set bot status
         activity = discord.Game(name="/shuffle | /config-roles")
@@ -74,17 +99,57 @@ class RoleShufflerBot(commands.Bot):
         """Called when the bot joins a new server."""
         print(f"📥 Joined new server: {guild.name} (ID: {guild.id})")
         
-        # Add server to database
-        if self.database:
-            await self.database.add_server(guild.id, guild.name)
+        # Queue the server to be added to the database
+        if self._server_worker:
+            self._server_ops.put_nowait((guild.id, guild.name))
 
     async def on_guild_remove(self, guild):
         """Called when the bot is removed from a server."""
         print(f"📤 Left server: {guild.name} (ID: {guild.id})")
         
-        # Remove server from database
-        if self.database:
-            await self.database.remove_server(guild.id)
+        # Queue the server to be removed from the database
+        if self._server_worker:
+            self._server_ops.put_nowait((guild.id, None))
+
+    async def _drain_server_ops(self):
+        """Background task that writes queued server joins/leaves in batches until it reads None."""
+        while True:
+            batch = [await self._server_ops.get()]
+            # Take everything else that queued up meanwhile without waiting
+            while not self._server_ops.empty():
+                batch.append(self._server_ops.get_nowait())
+
+            ops = [op for op in batch if op is not None]
+            if ops:
+                try:
+                    await self._apply_server_ops(ops)
+                except Exception as e:
+                    print(f"❌ Failed to update servers in database: {e}")
+            if None in batch:
+                return
+
+    async def _apply_server_ops(self, ops):
+        """
+        Write a batch of server joins/leaves.
+
+        Every server left at any point in the batch is removed first, so a leave
+        followed by a rejoin still clears its old configuration; then each server
+        whose latest event is a join is added.
+        """
+        latest = {}
+        left = set()
+        for guild_id, guild_name in ops:
+            latest[guild_id] = guild_name
+            if guild_name is None:
+                left.add(guild_id)
+
+        joined = [(guild_id, name) for guild_id, name in latest.items() if name is not None]
+
+        # Not one transaction: add_servers must see the removals already applied
+        # to the known-guild cache, which a transaction only does on commit
+        async with self.database.connection() as conn:
+            await self.database.remove_servers(list(left), conn=conn)
+            await self.database.add_servers(joined, conn=conn)
 
     async def on_error(self, event, *args, **kwargs):
         """Handle errors that occur during events."""
@@ -93,6 +158,13 @@ class RoleShufflerBot(commands.Bot):
     async def close(self):
         """Clean up when the bot is shutting down."""
         print("🔄 Shutting down bot...")
+
+        # Let the server writer finish what's queued (including a batch it may be
+        # writing right now), then stop at the None sentinel
+        if self._server_worker:
+            worker, self._server_worker = self._server_worker, None
+            self._server_ops.put_nowait(None)
+            await worker
         
         if self.database:
             await self.database.close()
@@ -101,7 +173,14 @@ class RoleShufflerBot(commands.Bot):
         print("👋 Bot shutdown complete")
 
 def load_bot_token():
-    """Load bot token from environment variables or config file."""
+    """Load bot token from environment variables or config file.
+
+    Reads config.json synchronously, so call this before the event loop starts.
+    """
+    global _token_cache
+    if _token_cache:
+        return _token_cache
+
     # Try environment variable first (for production/deployment)
     token = os.getenv('BOT_TOKEN')
     
@@ -120,15 +199,11 @@ def load_bot_token():
         print("Please set the BOT_TOKEN environment variable or update config.json")
         return None
     
+    _token_cache = token
     return token
 
-async def main():
+async def main(token: str):
     """Main function to run the bot."""
-    # Load bot token
-    token = load_bot_token()
-    if not token:
-        return
-
     # Create and run bot
     bot = RoleShufflerBot()
     
@@ -152,10 +227,19 @@ if __name__ == "__main__":
     if sys.version_info < (3, 8):
         print("❌ Python 3.8 or higher is required")
         sys.exit(1)
+
+    # Send log messages (e.g. from the database module) to the console
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     
-    # Run the bot
+    # Load bot token before the event loop starts (it may read config.json)
+    token = load_bot_token()
+    if not token:
+        sys.exit(1)
+
+    # Run the bot, on uvloop's event loop when it's installed
+    run = uvloop.run if uvloop else asyncio.run
     try:
-        asyncio.run(main())
+        run(main(token))
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
     except Exception as e:
@@ -2,6 +2,7 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from utils.permissions import ensure_user_permissions, ensure_bot_can_manage_role, PermissionCheckError
+from utils.embeds import warning_embed, success_embed, info_embed
 from database import Database
 
 class RoleConfigCommands(commands.Cog):
@@ -22,6 +23,9 @@ class RoleConfigCommands(commands.Cog):
     async def config_roles(self, interaction: discord.Interaction, action: str, role: discord.Role = None):
         """Configure which roles can be shuffled in this server."""
         
+        # Acknowledge right away so database work can't overrun Discord's 3 second window
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
         try:
             # Check user permissions for all actions
             await ensure_user_permissions(interaction, "manage_roles")
@@ -34,10 +38,10 @@ class RoleConfigCommands(commands.Cog):
                 await self._list_roles(interaction)
                 
         except PermissionCheckError as e:
-            await interaction.response.send_message(str(e), ephemeral=True)
+            await interaction.followup.send(str(e), ephemeral=True)
         except Exception as e:
             print(f"Error in config_roles command: {e}")
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "❌ An error occurred while processing your request. Please try again.",
                 ephemeral=True
             )
@@ -45,7 +49,7 @@ class RoleConfigCommands(commands.Cog):
     async def _add_role(self, interaction: discord.Interaction, role: discord.Role):
         """Add a role to the shuffleable roles list."""
         if not role:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "❌ You must specify a role to add. Use `/config-roles add @role`",
                 ephemeral=True
             )
@@ -54,22 +58,23 @@ class RoleConfigCommands(commands.Cog):
         # Check if bot can manage this role
         await ensure_bot_can_manage_role(interaction, role)
 
-        # Ensure server is in database
-        await self.db.add_server(interaction.guild.id, interaction.guild.name)
-
-        # Add role to database
-        success = await self.db.add_shuffleable_role(
-            interaction.guild.id,
-            role.id,
-            role.name,
-            interaction.user.id
-        )
+        # Ensure server is in database, then add the role, over one connection.
+        # The role row references the server row, so the two writes stay in order.
+        async with self.db.connection() as conn:
+            await self.db.add_server(interaction.guild.id, interaction.guild.name, conn=conn)
+
+            success = await self.db.add_shuffleable_role(
+                interaction.guild.id,
+                role.id,
+                role.name,
+                interaction.user.id,
+                conn=conn
+            )
 
         if success:
-            embed = discord.Embed(
-                title="✅ Role Added",
-                description=f"**{role.name}** has been added to the shuffleable roles list.",
-                color=discord.Color.green()
+            embed = success_embed(
+                "✅ Role Added",
+                f"**{role.name}** has been added to the shuffleable roles list."
             )
             embed.add_field(
                 name="What this means:",
@@ -77,18 +82,17 @@ class RoleConfigCommands(commands.Cog):
                 inline=False
             )
         else:
-            embed = discord.Embed(
-                title="⚠️ Role Already Added",
-                description=f"**{role.name}** is already in the shuffleable roles list.",
-                color=discord.Color.yellow()
+            embed = warning_embed(
+                "⚠️ Role Already Added",
+                f"**{role.name}** is already in the shuffleable roles list."
             )
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
     async def _remove_role(self, interaction: discord.Interaction, role: discord.Role):
         """Remove a role from the shuffleable roles list."""
         if not role:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "❌ You must specify a role to remove. Use `/config-roles remove @role`",
                 ephemeral=True
             )
@@ -98,10 +102,9 @@ class RoleConfigCommands(commands.Cog):
         success = await self.db.remove_shuffleable_role(interaction.guild.id, role.id)
 
         if success:
-            embed = discord.Embed(
-                title="✅ Role Removed",
-                description=f"**{role.name}** has been removed from the shuffleable roles list.",
-                color=discord.Color.green()
+            embed = success_embed(
+                "✅ Role Removed",
+                f"**{role.name}** has been removed from the shuffleable roles list."
             )
             embed.add_field(
                 name="What this means:",
@@ -109,23 +112,21 @@ class RoleConfigCommands(commands.Cog):
                 inline=False
             )
         else:
-            embed = discord.Embed(
-                title="⚠️ Role Not Found",
-                description=f"**{role.name}** was not in the shuffleable roles list.",
-                color=discord.Color.yellow()
+            embed = warning_embed(
+                "⚠️ Role Not Found",
+                f"**{role.name}** was not in the shuffleable roles list."
             )
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
     async def _list_roles(self, interaction: discord.Interaction):
         """List all shuffleable roles for this server."""
         roles_data = await self.db.get_shuffleable_roles(interaction.guild.id)
 
         if not roles_data:
-            embed = discord.Embed(
-                title="📝 Shuffleable Roles",
-                description="No shuffleable roles have been configured for this server.",
-                color=discord.Color.blue()
+            embed = info_embed(
+                "📝 Shuffleable Roles",
+                "No shuffleable roles have been configured for this server."
             )
             embed.add_field(
                 name="How to add roles:",
@@ -133,25 +134,26 @@ class RoleConfigCommands(commands.Cog):
                 inline=False
             )
         else:
-            embed = discord.Embed(
-                title="📝 Shuffleable Roles",
-                description=f"There are **{len(roles_data)}** roles configured for shuffling:",
-                color=discord.Color.blue()
+            embed = info_embed(
+                "📝 Shuffleable Roles",
+                f"There are **{len(roles_data)}** roles configured for shuffling:"
             )
 
             # Group roles into a formatted list
             role_list = []
+            total_len = 0  # Length of the lines once joined with newlines
+            get_role = interaction.guild.get_role
             for role_data in roles_data:
-                role = interaction.guild.get_role(role_data['role_id'])
+                role = get_role(role_data['role_id'])
                 if role:  # Role still exists
-                    member_count = len(role.members)
-                    role_list.append(f"• **{role.name}** ({member_count} members)")
+                    line = f"• **{role.name}** ({len(role.members)} members)"
                 else:  # Role was deleted
-                    role_list.append(f"• ~~{role_data['role_name']}~~ (deleted)")
+                    line = f"• ~~{role_data['role_name']}~~ (deleted)"
+                role_list.append(line)
+                total_len += len(line) + 1
 
             # Split into chunks if too long
-            role_text = "\n".join(role_list)
-            if len(role_text) > 1000:
+            if total_len - 1 > 1000:
                 # Split into multiple fields if too long
                 chunks = [role_list[i:i+10] for i in range(0, len(role_list), 10)]
                 for i, chunk in enumerate(chunks):
@@ -164,7 +166,7 @@ class RoleConfigCommands(commands.Cog):
             else:
                 embed.add_field(
                     name="Roles:",
-                    value=role_text,
+                    value="\n".join(role_list),
                     inline=False
                 )
 
@@ -174,7 +176,7 @@ class RoleConfigCommands(commands.Cog):
                 inline=False
             )
 
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
 async def setup(bot: commands.Bot, database: Database):
     """Setup function to add this cog to the bot."""
@@ -5,8 +5,12 @@ import random
 import asyncio
 from datetime import datetime, timedelta
 from utils.permissions import ensure_user_permissions, get_manageable_roles, PermissionCheckError
+from utils.embeds import error_embed, cooldown_embed, success_embed, info_embed
 from database import Database
 
+# How many member role edits may be in flight at once during a shuffle
+MAX_CONCURRENT_EDITS = 5
+
 class ShuffleConfirmView(discord.ui.View):
     """View for shuffle confirmation with Yes/No buttons."""
     
@@ -48,10 +52,9 @@ class ShuffleConfirmView(discord.ui.View):
             )
             return
 
-        embed = discord.Embed(
-            title="❌ Shuffle Cancelled",
-            description="The role shuffle has been cancelled.",
-            color=discord.Color.red()
+        embed = error_embed(
+            "❌ Shuffle Cancelled",
+            "The role shuffle has been cancelled."
         )
         await interaction.response.edit_message(embed=embed, view=None)
         self.stop()
@@ -59,10 +62,9 @@ class ShuffleConfirmView(discord.ui.View):
     async def on_timeout(self):
         """Handle timeout - disable buttons and show timeout message."""
         if not self.confirmed:
-            embed = discord.Embed(
-                title="⏰ Shuffle Timed Out",
-                description="The shuffle confirmation timed out after 5 minutes.",
-                color=discord.Color.orange()
+            embed = cooldown_embed(
+                "⏰ Shuffle Timed Out",
+                "The shuffle confirmation timed out after 5 minutes."
             )
             try:
                 await self.original_interaction.edit_original_response(embed=embed, view=None)
@@ -78,92 +80,85 @@ class ShuffleCommands(commands.Cog):
     async def shuffle_roles(self, interaction: discord.Interaction):
         """Main shuffle command that redistributes users among configured roles."""
         
+        # Acknowledge right away so database work can't overrun Discord's 3 second window
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
         try:
             # Check user permissions
             await ensure_user_permissions(interaction, "shuffle")
             
-            # Check cooldown
-            cooldown_expires = await self.db.check_shuffle_cooldown(interaction.guild.id)
+            # Check cooldown and load shuffleable roles in one database call
+            cooldown_expires, roles_data = await self.db.get_shuffle_context(interaction.guild.id)
             if cooldown_expires:
-                embed = discord.Embed(
-                    title="⏰ Shuffle on Cooldown",
-                    description=f"Please wait before shuffling again.",
-                    color=discord.Color.orange()
-                )
-                embed.add_field(
-                    name="Cooldown expires:",
-                    value=f"<t:{int(cooldown_expires.timestamp())}:R>",
-                    inline=False
-                )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+                await interaction.followup.send(embed=self._cooldown_embed(cooldown_expires), ephemeral=True)
                 return
 
-            # Get shuffleable roles from database
-            roles_data = await self.db.get_shuffleable_roles(interaction.guild.id)
-            
             if not roles_data:
-                embed = discord.Embed(
-                    title="❌ No Shuffleable Roles",
-                    description="No roles have been configured for shuffling in this server.",
-                    color=discord.Color.red()
+                embed = error_embed(
+                    "❌ No Shuffleable Roles",
+                    "No roles have been configured for shuffling in this server."
                 )
                 embed.add_field(
                     name="How to add roles:",
                     value="Use `/config-roles add @role` to add roles to the shuffle pool.",
                     inline=False
                 )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+                await interaction.followup.send(embed=embed, ephemeral=True)
                 return
 
             # Get actual role objects and filter by what bot can manage
             roles_to_shuffle = []
-            users_to_shuffle = []
             total_users = 0
 
-            bot_member = interaction.guild.get_member(self.bot.user.id)
-            
-            for role_data in roles_data:
-                role = interaction.guild.get_role(role_data['role_id'])
-                if role and role in get_manageable_roles(bot_member, [role]):
-                    if len(role.members) > 0:  # Only include roles with members
+            bot_member = interaction.guild.me
+
+            # Resolve configured roles that still exist, then filter them in one pass
+            get_role = interaction.guild.get_role
+            candidates = [get_role(role_data['role_id']) for role_data in roles_data]
+            candidates = [role for role in candidates if role is not None]
+            manageable = set(get_manageable_roles(bot_member, candidates))
+            member_counts = {}
+
+            for role in candidates:
+                if role in manageable:
+                    # Role.members scans the whole guild, so count it once per role
+                    member_count = len(role.members)
+                    if member_count > 0:  # Only include roles with members
                         roles_to_shuffle.append(role)
-                        users_to_shuffle.extend(role.members)
-                        total_users += len(role.members)
+                        member_counts[role.id] = member_count
+                        total_users += member_count
 
             if not roles_to_shuffle:
-                embed = discord.Embed(
-                    title="❌ No Valid Roles",
-                    description="No shuffleable roles found with members that I can manage.",
-                    color=discord.Color.red()
+                embed = error_embed(
+                    "❌ No Valid Roles",
+                    "No shuffleable roles found with members that I can manage."
                 )
                 embed.add_field(
                     name="Possible issues:",
                     value="• Roles are empty (no members)\n• Roles are above my highest role\n• I don't have Manage Roles permission",
                     inline=False
                 )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+                await interaction.followup.send(embed=embed, ephemeral=True)
                 return
 
             if len(roles_to_shuffle) < 2:
-                embed = discord.Embed(
-                    title="❌ Need More Roles",
-                    description="At least 2 roles with members are needed for shuffling.",
-                    color=discord.Color.red()
+                embed = error_embed(
+                    "❌ Need More Roles",
+                    "At least 2 roles with members are needed for shuffling."
                 )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
+                await interaction.followup.send(embed=embed, ephemeral=True)
                 return
 
             # Create confirmation embed
-            embed = discord.Embed(
-                title="🎲 Confirm Role Shuffle",
-                description=f"Are you sure you want to shuffle roles for **{total_users}** users?",
-                color=discord.Color.blue()
+            embed = info_embed(
+                "🎲 Confirm Role Shuffle",
+                f"Are you sure you want to shuffle roles for **{total_users}** users?"
             )
             
             # Add role information
             role_info = []
             for role in roles_to_shuffle:
-                role_info.append(f"• **{role.name}** ({len(role.members)} members)")
+                role_info.append(f"• **{role.name}** ({member_counts[role.id]} members)")
             
             embed.add_field(
                 name="Roles to shuffle:",
@@ -181,93 +176,121 @@ class ShuffleCommands(commands.Cog):
 
             # Create view with confirmation buttons
             view = ShuffleConfirmView(self, interaction, roles_to_shuffle)
-            await interaction.response.send_message(embed=embed, view=view)
+            await interaction.followup.send(embed=embed, view=view)
 
         except PermissionCheckError as e:
-            await interaction.response.send_message(str(e), ephemeral=True)
+            await interaction.followup.send(str(e), ephemeral=True)
         except Exception as e:
             print(f"Error in shuffle command: {e}")
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 "❌ An error occurred while processing your request. Please try again.",
                 ephemeral=True
             )
 
+    def _cooldown_embed(self, cooldown_expires) -> discord.Embed:
+        """Build the embed shown when the server is still on shuffle cooldown."""
+        embed = cooldown_embed(
+            "⏰ Shuffle on Cooldown",
+            "Please wait before shuffling again."
+        )
+        embed.add_field(
+            name="Cooldown expires:",
+            value=f"<t:{int(cooldown_expires.timestamp())}:R>",
+            inline=False
+        )
+        return embed
+
     async def perform_shuffle(self, interaction: discord.Interaction, roles_to_shuffle: list):
         """Perform the actual role shuffle."""
+        # Claim the cooldown before touching any roles, so another shuffle confirmed
+        # while this one runs is turned away instead of running alongside it
+        cooldown_expires = await self.db.claim_shuffle_cooldown(interaction.guild.id)
+        if cooldown_expires:
+            await interaction.edit_original_response(content=None, embed=self._cooldown_embed(cooldown_expires), view=None)
+            return
+
+        finalized = False
         try:
-            # Collect all users from all roles
-            all_users = []
-            users_by_role = {}
-            
+            # Collect each user once, keyed by id (users may hold multiple shuffleable roles)
+            users_by_id = {}
             for role in roles_to_shuffle:
-                users_by_role[role.id] = list(role.members)
-                all_users.extend(role.members)
-            
-            # Remove duplicates (users with multiple shuffleable roles)
-            unique_users = list(set(all_users))
-            
+                for member in role.members:
+                    users_by_id.setdefault(member.id, member)
+
+            unique_users = list(users_by_id.values())
+
             # Shuffle the users
             random.shuffle(unique_users)
-            
-            # Calculate how many users should get each role
-            users_per_role = len(unique_users) // len(roles_to_shuffle)
-            extra_users = len(unique_users) % len(roles_to_shuffle)
-            
-            # Distribute users to roles
-            user_index = 0
-            role_assignments = {}
-            
-            for i, role in enumerate(roles_to_shuffle):
-                # Some roles get one extra user if there's a remainder
-                role_user_count = users_per_role + (1 if i < extra_users else 0)
-                role_assignments[role] = unique_users[user_index:user_index + role_user_count]
-                user_index += role_user_count
-
-            # Remove all users from their current shuffleable roles
-            for user in unique_users:
-                for role in roles_to_shuffle:
-                    if role in user.roles:
-                        try:
-                            await user.remove_roles(role, reason="Role shuffle - removing old role")
-                        except discord.HTTPException as e:
-                            print(f"Failed to remove role {role.name} from {user.display_name}: {e}")
-
-            # Add users to their new roles
+
+            # Deal roles out round-robin so the distribution is as even as possible
+            role_count = len(roles_to_shuffle)
+            assigned_role_by_user = {
+                user: roles_to_shuffle[i % role_count]
+                for i, user in enumerate(unique_users)
+            }
+
+            shuffle_role_set = set(roles_to_shuffle)
+
+            # Swap each user's shuffle roles for their new one in a single edit,
+            # running several edits at once to overlap request latency
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_EDITS)
+
+            async def apply_roles(user):
+                assigned_role = assigned_role_by_user.get(user)
+
+                # Users who already hold exactly their new shuffle role need no edit
+                current_shuffle_roles = shuffle_role_set.intersection(user.roles)
+                if assigned_role and current_shuffle_roles == {assigned_role}:
+                    return user, assigned_role, None
+
+                new_roles = [r for r in user.roles if r not in shuffle_role_set]
+                if assigned_role:
+                    new_roles.append(assigned_role)
+
+                async with semaphore:
+                    try:
+                        await user.edit(roles=new_roles, reason="Role shuffle")
+                        return user, assigned_role, None
+                    except discord.HTTPException as e:
+                        return user, assigned_role, e
+
+            results = await asyncio.gather(*(apply_roles(user) for user in unique_users))
+
             successful_assignments = 0
             failed_assignments = []
-            
-            for role, assigned_users in role_assignments.items():
-                for user in assigned_users:
-                    try:
-                        await user.add_roles(role, reason="Role shuffle - assigning new role")
+
+            for user, assigned_role, error in results:
+                if error is None:
+                    if assigned_role:
                         successful_assignments += 1
-                    except discord.HTTPException as e:
-                        print(f"Failed to add role {role.name} to {user.display_name}: {e}")
-                        failed_assignments.append((user.display_name, role.name))
+                else:
+                    role_name = assigned_role.name if assigned_role else "(none)"
+                    print(f"Failed to update roles for {user.display_name}: {error}")
+                    failed_assignments.append((user.display_name, role_name))
 
-            # Set cooldown
-            await self.db.set_shuffle_cooldown(interaction.guild.id, interaction.user.id)
-            
-            # Log the shuffle
+            # Set cooldown and log the shuffle
             role_names = [role.name for role in roles_to_shuffle]
-            await self.db.log_shuffle(
+            await self.db.finalize_shuffle(
                 interaction.guild.id,
                 interaction.user.id,
                 len(unique_users),
                 role_names
             )
+            finalized = True
 
             # Create success embed
-            embed = discord.Embed(
-                title="✅ Roles Shuffled Successfully!",
-                description=f"Successfully shuffled **{successful_assignments}** role assignments!",
-                color=discord.Color.green()
+            embed = success_embed(
+                "✅ Roles Shuffled Successfully!",
+                f"Successfully shuffled **{successful_assignments}** role assignments!"
             )
             
             # Show new role distribution
             distribution_info = []
-            for role, assigned_users in role_assignments.items():
-                distribution_info.append(f"• **{role.name}**: {len(assigned_users)} members")
+            users_per_role, extra_users = divmod(len(unique_users), role_count)
+            for i, role in enumerate(roles_to_shuffle):
+                # The first roles dealt each picked up one of the remainder users
+                assigned_count = users_per_role + (1 if i < extra_users else 0)
+                distribution_info.append(f"• **{role.name}**: {assigned_count} members")
             
             embed.add_field(
                 name="New role distribution:",
@@ -298,12 +321,14 @@ class ShuffleCommands(commands.Cog):
 
         except Exception as e:
             print(f"Error performing shuffle: {e}")
-            error_embed = discord.Embed(
-                title="❌ Shuffle Failed",
-                description="An error occurred while shuffling roles. Some role changes may have been partially completed.",
-                color=discord.Color.red()
+            if not finalized:
+                # Let the server try again rather than wait out a shuffle that never finished
+                await self.db.release_shuffle_cooldown(interaction.guild.id)
+            embed = error_embed(
+                "❌ Shuffle Failed",
+                "An error occurred while shuffling roles. Some role changes may have been partially completed."
             )
-            await interaction.edit_original_response(embed=error_embed, view=None)
+            await interaction.edit_original_response(embed=embed, view=None)
 
 async def setup(bot: commands.Bot, database: Database):
     """Setup function to add this cog to the bot."""
@@ -1,17 +1,68 @@
 import asyncio
 import asyncpg
-import json
+import logging
 import os
-from typing import List, Optional
-from datetime import datetime, timedelta
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+try:
+    from orjson import loads as _loads  # Faster JSON parsing when installed
+except ImportError:
+    from json import loads as _loads
+
+log = logging.getLogger(__name__)
+
+# How long (in seconds) a guild's shuffleable roles are served from memory
+ROLES_CACHE_TTL = 60
+# How many guilds' shuffleable roles are kept in memory at most
+ROLES_CACHE_MAX_SIZE = 1000
+
+# How long a server must wait between shuffles
+SHUFFLE_COOLDOWN = timedelta(minutes=5)
+
+# Connection pool defaults, overridable through the database config.
+# The max size follows the usual (cpu cores * 2) + effective spindles rule.
+DEFAULT_POOL_MIN = 5
+DEFAULT_POOL_MAX = (os.cpu_count() or 1) * 2 + 1
+DEFAULT_COMMAND_TIMEOUT = 10           # seconds before a query is abandoned
+MAX_INACTIVE_CONNECTION_LIFETIME = 300  # seconds before idle connections are closed
+STATEMENT_CACHE_SIZE = 1024             # prepared statements kept per connection
+
+# Queued history rows at or above this count are written with COPY instead of INSERT
+HISTORY_COPY_THRESHOLD = 500
+HISTORY_COLUMNS = ['guild_id', 'triggered_by', 'users_affected', 'roles_shuffled']
+
+# Old history rows are pruned in batches of this size, so each DELETE stays well inside the query timeout
+HISTORY_PRUNE_BATCH_SIZE = 5000
 
 class Database:
     def __init__(self, config: dict):
         self.config = config
         self.pool = None
+        # guild_id -> (fetched_at, roles) for get_shuffleable_roles, least recently used first
+        self._roles_cache = OrderedDict()
+        # guild_id -> guild_name for every row in the servers table
+        self._known_guilds = {}
+        # guild_id -> (monotonic deadline, cooldown_expires) for shuffle cooldowns
+        self._cooldowns = {}
+        # guild_ids with a claimed shuffle still running (they stay on cooldown until it ends)
+        self._shuffling = set()
+        # Shuffle history rows waiting to be written, and the task writing them
+        self._history_queue = None
+        self._history_writer = None
+        # connection -> cache updates waiting for its transaction() to commit
+        self._pending_cache_updates = {}
+        # Startup task deleting history past the configured retention, if any
+        self._history_pruner = None
 
     async def connect(self):
         """Initialize the database connection pool."""
+        pool_max = self.config.get('pool_max', DEFAULT_POOL_MAX)
+        pool_min = min(self.config.get('pool_min', DEFAULT_POOL_MIN), pool_max)
+
         try:
             self.pool = await asyncpg.create_pool(
                 host=self.config['host'],
@@ -19,20 +70,99 @@ class Database:
                 database=self.config['database'],
                 user=self.config['user'],
                 password=self.config['password'],
-                min_size=5,
-                max_size=20
+                min_size=pool_min,
+                max_size=pool_max,
+                command_timeout=self.config.get('command_timeout', DEFAULT_COMMAND_TIMEOUT),
+                max_inactive_connection_lifetime=MAX_INACTIVE_CONNECTION_LIFETIME,
+                statement_cache_size=STATEMENT_CACHE_SIZE
             )
-            print("✅ Connected to PostgreSQL database")
+            log.info("✅ Connected to PostgreSQL database")
             await self._create_tables()
+            await self._load_known_guilds()
+            self._history_queue = asyncio.Queue()
+            self._history_writer = asyncio.create_task(self._write_queued_history())
         except Exception as e:
-            print(f"❌ Failed to connect to database: {e}")
+            log.error("❌ Failed to connect to database: %s", e)
             raise
 
+        # Pruning a large history table can be slow, so it runs in the background
+        # and a failure is only logged rather than stopping the bot from starting
+        if self.config.get('history_retention_days'):
+            self._history_pruner = asyncio.create_task(
+                self._prune_history_on_startup(timedelta(days=self.config['history_retention_days']))
+            )
+
     async def close(self):
         """Close the database connection pool."""
+        if self._history_pruner:
+            self._history_pruner.cancel()
+            self._history_pruner = None
+
+        # Let the history writer finish what's queued (including a batch it may be
+        # writing right now), then stop at the None sentinel
+        if self._history_writer:
+            writer, self._history_writer = self._history_writer, None
+            self._history_queue.put_nowait(None)
+            await writer
+
         if self.pool:
             await self.pool.close()
-            print("📊 Database connection closed")
+            log.info("📊 Database connection closed")
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Borrow one pooled connection to pass as ``conn=`` to several methods in a row,
+        without the BEGIN/COMMIT round trips of transaction().
+        """
+        async with self.pool.acquire() as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Acquire one connection and open a transaction on it.
+
+        Pass the yielded connection as ``conn=`` to other methods to run them
+        together, e.g. ``async with db.transaction() as conn: ...``.
+        """
+        async with self.pool.acquire() as conn:
+            updates = self._pending_cache_updates[conn] = []
+            try:
+                async with conn.transaction():
+                    yield conn
+            finally:
+                del self._pending_cache_updates[conn]
+            # Only reached once the transaction has committed
+            for update in updates:
+                update()
+
+    def _after_commit(self, conn, update):
+        """
+        Apply an in-memory cache update now, or, if conn belongs to a
+        transaction(), once it commits so a rollback leaves the caches alone.
+        """
+        pending = self._pending_cache_updates.get(conn)
+        if pending is None:
+            update()
+        else:
+            pending.append(update)
+
+    def _forget_guilds(self, guild_ids):
+        """Drop removed servers from every in-memory cache."""
+        for guild_id in guild_ids:
+            self._known_guilds.pop(guild_id, None)
+            self._roles_cache.pop(guild_id, None)
+            self._cooldowns.pop(guild_id, None)
+
+    @asynccontextmanager
+    async def _acquire(self, conn=None):
+        """Use the caller's connection if one was passed, otherwise borrow one from the pool."""
+        if conn is not None:
+            yield conn
+        else:
+            async with self.pool.acquire() as acquired:
+                yield acquired
 
     async def _create_tables(self):
         """Create necessary tables if they don't exist."""
@@ -60,15 +190,6 @@ class Database:
                 )
             ''')
 
-            # Cooldowns table to track shuffle cooldowns per server
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS shuffle_cooldowns (
-                    guild_id BIGINT PRIMARY KEY REFERENCES servers(guild_id) ON DELETE CASCADE,
-                    last_shuffle TIMESTAMP NOT NULL,
-                    triggered_by BIGINT NOT NULL
-                )
-            ''')
-
             # Shuffle history table for logging (optional, for future features)
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS shuffle_history (
@@ -81,108 +202,314 @@ class Database:
                 )
             ''')
 
-            print("📋 Database tables created/verified")
+            # Index-only, pre-sorted reads for get_shuffleable_roles
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_shuffleable_roles_guild
+                ON shuffleable_roles (guild_id, role_name)
+                INCLUDE (role_id, added_by, created_at)
+            ''')
+
+            # Newest-first reads for get_shuffle_history
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_shuffle_history_guild_ts
+                ON shuffle_history (guild_id, timestamp DESC)
+            ''')
+
+            # Range deletes for prune_shuffle_history
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_shuffle_history_ts
+                ON shuffle_history (timestamp)
+            ''')
+
+            log.info("📋 Database tables created/verified")
+
+    async def _load_known_guilds(self):
+        """Remember which servers are already stored so add_server can skip them."""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch('SELECT guild_id, guild_name FROM servers')
+        self._known_guilds = {row['guild_id']: row['guild_name'] for row in rows}
 
     # Server management
-    async def add_server(self, guild_id: int, guild_name: str):
+    async def add_server(self, guild_id: int, guild_name: str, *, conn=None):
         """Add or update a server in the database."""
-        async with self.pool.acquire() as conn:
+        # Nothing to write if the server is already stored under this name
+        if self._known_guilds.get(guild_id) == guild_name:
+            return
+
+        async with self._acquire(conn) as conn:
             await conn.execute('''
                 INSERT INTO servers (guild_id, guild_name, updated_at)
                 VALUES ($1, $2, CURRENT_TIMESTAMP)
-                ON CONFLICT (guild_id) 
-                DO UPDATE SET guild_name = $2, updated_at = CURRENT_TIMESTAMP
+                ON CONFLICT (guild_id)
+                DO UPDATE SET guild_name = EXCLUDED.guild_name, updated_at = CURRENT_TIMESTAMP
+                WHERE servers.guild_name IS DISTINCT FROM EXCLUDED.guild_name
             ''', guild_id, guild_name)
+            self._after_commit(conn, lambda: self._known_guilds.update({guild_id: guild_name}))
 
-    async def remove_server(self, guild_id: int):
+    async def remove_server(self, guild_id: int, *, conn=None):
         """Remove a server and all associated data."""
-        async with self.pool.acquire() as conn:
+        async with self._acquire(conn) as conn:
             await conn.execute('DELETE FROM servers WHERE guild_id = $1', guild_id)
+            self._after_commit(conn, lambda: self._forget_guilds([guild_id]))
+
+    async def add_servers(self, guilds: List[Tuple[int, str]], *, conn=None):
+        """Add or update several servers at once. Takes (guild_id, guild_name) pairs."""
+        # Only write servers that are new or have been renamed (one row per server,
+        # since a single upsert can't touch the same row twice)
+        changed = {guild_id: name for guild_id, name in guilds if self._known_guilds.get(guild_id) != name}
+        if not changed:
+            return
+
+        async with self._acquire(conn) as conn:
+            # One multi-row statement rather than a round trip per server
+            await conn.execute('''
+                INSERT INTO servers (guild_id, guild_name, updated_at)
+                SELECT guild_id, guild_name, CURRENT_TIMESTAMP
+                FROM unnest($1::bigint[], $2::varchar[]) AS new(guild_id, guild_name)
+                ON CONFLICT (guild_id)
+                DO UPDATE SET guild_name = EXCLUDED.guild_name, updated_at = CURRENT_TIMESTAMP
+                WHERE servers.guild_name IS DISTINCT FROM EXCLUDED.guild_name
+            ''', list(changed.keys()), list(changed.values()))
+            self._after_commit(conn, lambda: self._known_guilds.update(changed))
+
+    async def remove_servers(self, guild_ids: List[int], *, conn=None):
+        """Remove several servers and all their associated data at once."""
+        if not guild_ids:
+            return
+
+        async with self._acquire(conn) as conn:
+            await conn.execute('DELETE FROM servers WHERE guild_id = ANY($1::bigint[])', guild_ids)
+            self._after_commit(conn, lambda: self._forget_guilds(guild_ids))
 
     # Shuffleable roles management
-    async def add_shuffleable_role(self, guild_id: int, role_id: int, role_name: str, added_by: int) -> bool:
+    async def add_shuffleable_role(self, guild_id: int, role_id: int, role_name: str, added_by: int, *, conn=None) -> bool:
         """Add a role to the shuffleable roles list."""
         try:
-            async with self.pool.acquire() as conn:
+            async with self._acquire(conn) as conn:
                 await conn.execute('''
                     INSERT INTO shuffleable_roles (guild_id, role_id, role_name, added_by)
                     VALUES ($1, $2, $3, $4)
                     ON CONFLICT (guild_id, role_id) DO NOTHING
                 ''', guild_id, role_id, role_name, added_by)
-                return True
+                self._after_commit(conn, lambda: self._roles_cache.pop(guild_id, None))
+            return True
         except Exception as e:
-            print(f"Error adding shuffleable role: {e}")
+            log.error("Error adding shuffleable role: %s", e)
             return False
 
-    async def remove_shuffleable_role(self, guild_id: int, role_id: int) -> bool:
+    async def remove_shuffleable_role(self, guild_id: int, role_id: int, *, conn=None) -> bool:
         """Remove a role from the shuffleable roles list."""
         try:
-            async with self.pool.acquire() as conn:
+            async with self._acquire(conn) as conn:
                 result = await conn.execute('''
                     DELETE FROM shuffleable_roles 
                     WHERE guild_id = $1 AND role_id = $2
                 ''', guild_id, role_id)
-                return result != "DELETE 0"
+                self._after_commit(conn, lambda: self._roles_cache.pop(guild_id, None))
+            return result != "DELETE 0"
         except Exception as e:
-            print(f"Error removing shuffleable role: {e}")
+            log.error("Error removing shuffleable role: %s", e)
             return False
 
-    async def get_shuffleable_roles(self, guild_id: int) -> List[dict]:
-        """Get all shuffleable roles for a server."""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
+    async def get_shuffleable_roles(self, guild_id: int, *, conn=None) -> List[asyncpg.Record]:
+        """Get all shuffleable roles for a server, served from cache while fresh."""
+        # Inside a transaction() the cache may not match what this connection
+        # sees, and what it reads may yet be rolled back, so bypass the cache
+        in_transaction = conn in self._pending_cache_updates
+        if not in_transaction:
+            cached = self._cached_shuffleable_roles(guild_id)
+            if cached is not None:
+                return cached
+
+        async with self._acquire(conn) as conn:
+            roles = await conn.fetch('''
                 SELECT role_id, role_name, added_by, created_at
                 FROM shuffleable_roles
                 WHERE guild_id = $1
                 ORDER BY role_name
             ''', guild_id)
-            
-            return [dict(row) for row in rows]
 
-    # Cooldown management
-    async def set_shuffle_cooldown(self, guild_id: int, triggered_by: int):
+        if in_transaction:
+            return roles
+
+        self._roles_cache[guild_id] = (time.monotonic(), roles)
+        self._roles_cache.move_to_end(guild_id)
+        if len(self._roles_cache) > ROLES_CACHE_MAX_SIZE:
+            self._roles_cache.popitem(last=False)
+        return roles
+
+    def _cached_shuffleable_roles(self, guild_id: int) -> Optional[List[asyncpg.Record]]:
+        """Return the cached roles for a server, or None if missing or stale."""
+        cached = self._roles_cache.get(guild_id)
+        if cached and time.monotonic() - cached[0] < ROLES_CACHE_TTL:
+            self._roles_cache.move_to_end(guild_id)
+            return cached[1]
+        return None
+
+    # Cooldown management (kept in memory; losing it on restart only shortens one 5 minute window)
+    async def set_shuffle_cooldown(self, guild_id: int):
         """Set a cooldown for shuffling in a server."""
-        async with self.pool.acquire() as conn:
-            await conn.execute('''
-                INSERT INTO shuffle_cooldowns (guild_id, last_shuffle, triggered_by)
-                VALUES ($1, CURRENT_TIMESTAMP, $2)
-                ON CONFLICT (guild_id)
-                DO UPDATE SET last_shuffle = CURRENT_TIMESTAMP, triggered_by = $2
-            ''', guild_id, triggered_by)
+        self._start_cooldown(guild_id)
 
     async def check_shuffle_cooldown(self, guild_id: int) -> Optional[datetime]:
         """Check if shuffle is on cooldown. Returns None if no cooldown, or datetime when cooldown expires."""
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow('''
-                SELECT last_shuffle + INTERVAL '5 minutes' as cooldown_expires
-                FROM shuffle_cooldowns
-                WHERE guild_id = $1
-                AND last_shuffle + INTERVAL '5 minutes' > CURRENT_TIMESTAMP
-            ''', guild_id)
-            
-            return row['cooldown_expires'] if row else None
+        return self._active_cooldown(guild_id)
+
+    async def claim_shuffle_cooldown(self, guild_id: int) -> Optional[datetime]:
+        """
+        Check the cooldown and mark a shuffle as running in the same step.
+
+        Returns None if the caller may shuffle now, or the datetime when the
+        current cooldown expires. Nothing is awaited between the check and the
+        claim, so two shuffles confirmed at once can't both get through. The
+        server stays claimed until finalize_shuffle or release_shuffle_cooldown,
+        however long the shuffle's role edits take.
+        """
+        cooldown_expires = self._active_cooldown(guild_id)
+        if cooldown_expires:
+            return cooldown_expires
+
+        self._shuffling.add(guild_id)
+        return None
+
+    async def release_shuffle_cooldown(self, guild_id: int):
+        """Clear a server's cooldown, e.g. when a claimed shuffle failed before finishing."""
+        self._shuffling.discard(guild_id)
+        self._cooldowns.pop(guild_id, None)
+
+    def _start_cooldown(self, guild_id: int):
+        """Start a server's cooldown from now."""
+        cooldown_expires = datetime.now(timezone.utc) + SHUFFLE_COOLDOWN
+        self._cooldowns[guild_id] = (time.monotonic() + SHUFFLE_COOLDOWN.total_seconds(), cooldown_expires)
+
+    def _active_cooldown(self, guild_id: int) -> Optional[datetime]:
+        """Return when a server's cooldown expires, or None if it isn't on cooldown."""
+        if guild_id in self._shuffling:
+            # The cooldown starts once the running shuffle finishes, so this is the earliest expiry
+            return datetime.now(timezone.utc) + SHUFFLE_COOLDOWN
+
+        cooldown = self._cooldowns.get(guild_id)
+        if not cooldown:
+            return None
+        if time.monotonic() >= cooldown[0]:
+            del self._cooldowns[guild_id]
+            return None
+        return cooldown[1]
+
+    async def get_shuffle_context(self, guild_id: int, *, conn=None) -> Tuple[Optional[datetime], List[asyncpg.Record]]:
+        """
+        Get everything /shuffle needs to start.
+
+        Returns (cooldown_expires, roles). When the server is on cooldown the
+        roles are not looked up and an empty list is returned.
+        """
+        cooldown_expires = await self.check_shuffle_cooldown(guild_id)
+        if cooldown_expires:
+            return cooldown_expires, []
+
+        return None, await self.get_shuffleable_roles(guild_id, conn=conn)
 
     # Shuffle history
-    async def log_shuffle(self, guild_id: int, triggered_by: int, users_affected: int, roles_shuffled: List[str]):
+    async def log_shuffle(self, guild_id: int, triggered_by: int, users_affected: int, roles_shuffled: List[str], *, conn=None):
         """Log a shuffle event for history tracking."""
-        async with self.pool.acquire() as conn:
+        async with self._acquire(conn) as conn:
             await conn.execute('''
                 INSERT INTO shuffle_history (guild_id, triggered_by, users_affected, roles_shuffled)
                 VALUES ($1, $2, $3, $4)
             ''', guild_id, triggered_by, users_affected, roles_shuffled)
 
-    async def get_shuffle_history(self, guild_id: int, limit: int = 10) -> List[dict]:
+    async def log_shuffles_bulk(self, events: List[Tuple[int, int, int, List[str]]], *, conn=None):
+        """
+        Log several shuffle events at once.
+
+        Takes (guild_id, triggered_by, users_affected, roles_shuffled) tuples.
+        Large batches are streamed with COPY; smaller ones are pipelined with executemany.
+        """
+        if not events:
+            return
+
+        async with self._acquire(conn) as conn:
+            if len(events) >= HISTORY_COPY_THRESHOLD:
+                await conn.copy_records_to_table('shuffle_history', records=events, columns=HISTORY_COLUMNS)
+            else:
+                await conn.executemany('''
+                    INSERT INTO shuffle_history (guild_id, triggered_by, users_affected, roles_shuffled)
+                    VALUES ($1, $2, $3, $4)
+                ''', events)
+
+    async def _write_queued_history(self):
+        """Background task that writes queued shuffle history in batches until it reads None."""
+        while True:
+            batch = [await self._history_queue.get()]
+            # Take everything else that queued up meanwhile without waiting
+            while not self._history_queue.empty():
+                batch.append(self._history_queue.get_nowait())
+
+            events = [event for event in batch if event is not None]
+            if events:
+                await self._write_history_batch(events)
+            if None in batch:
+                return
+
+    async def _write_history_batch(self, events: List[Tuple[int, int, int, List[str]]]):
+        """Write a batch of shuffle history, falling back to one row at a time if the batch fails."""
+        try:
+            await self.log_shuffles_bulk(events)
+            return
+        except Exception as e:
+            log.warning("⚠️ Failed to write shuffle history batch, retrying row by row: %s", e)
+
+        # The batch is all-or-nothing, so one bad row (e.g. a server removed
+        # meanwhile) shouldn't cost every other server its history
+        for event in events:
+            try:
+                await self.log_shuffle(*event)
+            except Exception as e:
+                log.error("❌ Failed to write shuffle history for guild %s: %s", event[0], e)
+
+    async def finalize_shuffle(self, guild_id: int, triggered_by: int, users_affected: int, roles_shuffled: List[str]):
+        """Start the shuffle cooldown and queue the shuffle to be logged in the background."""
+        self._shuffling.discard(guild_id)
+        await self.set_shuffle_cooldown(guild_id)
+        self._history_queue.put_nowait((guild_id, triggered_by, users_affected, roles_shuffled))
+
+    async def prune_shuffle_history(self, older_than: timedelta, *, conn=None) -> int:
+        """Delete shuffle history older than the given age. Returns how many rows were removed."""
+        removed = 0
+        async with self._acquire(conn) as conn:
+            # Delete a bounded batch at a time until no old rows are left
+            while True:
+                result = await conn.execute('''
+                    DELETE FROM shuffle_history
+                    WHERE id IN (
+                        SELECT id FROM shuffle_history
+                        WHERE timestamp < CURRENT_TIMESTAMP - $1::interval
+                        LIMIT $2
+                    )
+                ''', older_than, HISTORY_PRUNE_BATCH_SIZE)
+                deleted = int(result.split()[-1])
+                removed += deleted
+                if deleted < HISTORY_PRUNE_BATCH_SIZE:
+                    return removed
+
+    async def _prune_history_on_startup(self, older_than: timedelta):
+        """Background task run once by connect() to apply history retention."""
+        try:
+            removed = await self.prune_shuffle_history(older_than)
+            log.info("🧹 Pruned %s old shuffle history entries", removed)
+        except Exception as e:
+            log.error("❌ Failed to prune shuffle history: %s", e)
+
+    async def get_shuffle_history(self, guild_id: int, limit: int = 10, *, conn=None) -> List[asyncpg.Record]:
         """Get recent shuffle history for a server."""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
+        async with self._acquire(conn) as conn:
+            return await conn.fetch('''
                 SELECT triggered_by, users_affected, roles_shuffled, timestamp
                 FROM shuffle_history
                 WHERE guild_id = $1
                 ORDER BY timestamp DESC
                 LIMIT $2
             ''', guild_id, limit)
-            
-            return [dict(row) for row in rows]
 
 
 # Utility function to load database from config
@@ -199,14 +526,23 @@ def load_database_config():
             'user': os.getenv('DB_USER'),
             'password': os.getenv('DB_PASSWORD')
         }
+        # Optional connection pool tuning
+        if os.getenv('DB_POOL_MIN'):
+            config['pool_min'] = int(os.getenv('DB_POOL_MIN'))
+        if os.getenv('DB_POOL_MAX'):
+            config['pool_max'] = int(os.getenv('DB_POOL_MAX'))
+        if os.getenv('DB_COMMAND_TIMEOUT'):
+            config['command_timeout'] = float(os.getenv('DB_COMMAND_TIMEOUT'))
+        if os.getenv('DB_HISTORY_RETENTION_DAYS'):
+            config['history_retention_days'] = int(os.getenv('DB_HISTORY_RETENTION_DAYS'))
     else:
         # Fall back to config.json (for development)
         try:
-            with open('config.json', 'r') as f:
-                data = json.load(f)
+            with open('config.json', 'rb') as f:
+                data = _loads(f.read())
                 config = data['database']
         except FileNotFoundError:
-            print("❌ No config.json found and no environment variables set")
+            log.error("❌ No config.json found and no environment variables set")
             raise
     
     return config
\ No newline at end of file
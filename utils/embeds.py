@@ -0,0 +1,31 @@
+import discord
+
+def error_embed(title: str, description: str) -> discord.Embed:
+    """
+    Build a red embed for failed or rejected actions.
+    """
+    return discord.Embed(title=title, description=description, color=discord.Color.red())
+
+def warning_embed(title: str, description: str) -> discord.Embed:
+    """
+    Build a yellow embed for actions that had nothing to do.
+    """
+    return discord.Embed(title=title, description=description, color=discord.Color.yellow())
+
+def cooldown_embed(title: str, description: str) -> discord.Embed:
+    """
+    Build an orange embed for cooldowns and timed-out prompts.
+    """
+    return discord.Embed(title=title, description=description, color=discord.Color.orange())
+
+def success_embed(title: str, description: str) -> discord.Embed:
+    """
+    Build a green embed for completed actions.
+    """
+    return discord.Embed(title=title, description=description, color=discord.Color.green())
+
+def info_embed(title: str, description: str) -> discord.Embed:
+    """
+    Build a blue embed for informational replies and prompts.
+    """
+    return discord.Embed(title=title, description=description, color=discord.Color.blue())
@@ -1,6 +1,30 @@
 import discord
 from typing import Union
 
+# Administrator or Manage Roles, tested with a single AND against Permissions.value
+_ROLE_MGMT_MASK = discord.Permissions.administrator.flag | discord.Permissions.manage_roles.flag
+
+# Permission error messages, filled in with % formatting
+_PERM_ERR_TMPL = (
+    "❌ %s, you need **%s** permission to use this command.\n"
+    "Contact a server administrator if you believe this is an error."
+)
+_BOT_PERM_ERR_TMPL = (
+    "❌ I cannot manage the role **%s**.\n"
+    "This might be because:\n"
+    "• The role is higher than my highest role\n"
+    "• I don't have the **Manage Roles** permission\n"
+    "• The role is a special role (like @everyone)\n\n"
+    "Please check my permissions and role hierarchy."
+)
+
+def _has_manage_roles_member(member: discord.Member, guild: discord.Guild) -> bool:
+    """
+    Role management check for callers that already know they hold a Member.
+    """
+    # Guild owner always has permission; otherwise needs administrator or manage roles
+    return member.id == guild.owner_id or bool(member.guild_permissions.value & _ROLE_MGMT_MASK)
+
 def has_manage_roles_permission(user: Union[discord.Member, discord.User], guild: discord.Guild) -> bool:
     """
     Check if a user has permission to manage roles (configure shuffleable roles).
@@ -13,21 +37,25 @@ def has_manage_roles_permission(user: Union[discord.Member, discord.User], guild
     if not isinstance(user, discord.Member):
         return False
     
-    # Guild owner always has permission
-    if user.id == guild.owner_id:
-        return True
-    
-    # Check for administrator or manage roles permission
-    return user.guild_permissions.administrator or user.guild_permissions.manage_roles
+    return _has_manage_roles_member(user, guild)
 
 def has_shuffle_permission(user: Union[discord.Member, discord.User], guild: discord.Guild) -> bool:
     """
     Check if a user has permission to trigger role shuffles.
     
     For now, this uses the same permissions as manage_roles, but can be customized
-    in the future if you want different permission levels.
+    in the future (in _has_shuffle_member) if you want different permission levels.
+    """
+    if not isinstance(user, discord.Member):
+        return False
+
+    return _has_shuffle_member(user, guild)
+
+def _has_shuffle_member(member: discord.Member, guild: discord.Guild) -> bool:
+    """
+    Shuffle permission check for callers that already know they hold a Member.
     """
-    return has_manage_roles_permission(user, guild)
+    return _has_manage_roles_member(member, guild)
 
 def can_bot_manage_role(bot_member: discord.Member, role: discord.Role) -> bool:
     """
@@ -52,30 +80,29 @@ def can_bot_manage_role(bot_member: discord.Member, role: discord.Role) -> bool:
 def get_manageable_roles(bot_member: discord.Member, roles: list[discord.Role]) -> list[discord.Role]:
     """
     Filter a list of roles to only include ones the bot can manage.
+
+    Same rules as can_bot_manage_role, but the bot's permissions and top role
+    are looked up once instead of once per role.
     """
-    return [role for role in roles if can_bot_manage_role(bot_member, role)]
+    if not bot_member.guild_permissions.manage_roles:
+        return []
+
+    # @everyone shares its id with the guild, so comparing ids skips a method call per role
+    top_position = bot_member.top_role.position
+    everyone_id = bot_member.guild.id
+    return [role for role in roles if role.position < top_position and role.id != everyone_id]
 
 def format_permission_error(user: discord.Member, required_permission: str) -> str:
     """
     Format a user-friendly permission error message.
     """
-    return (
-        f"❌ {user.mention}, you need **{required_permission}** permission to use this command.\n"
-        f"Contact a server administrator if you believe this is an error."
-    )
+    return _PERM_ERR_TMPL % (user.mention, required_permission)
 
 def format_bot_permission_error(role_name: str) -> str:
     """
     Format a user-friendly error message when the bot can't manage a role.
     """
-    return (
-        f"❌ I cannot manage the role **{role_name}**.\n"
-        f"This might be because:\n"
-        f"• The role is higher than my highest role\n"
-        f"• I don't have the **Manage Roles** permission\n"
-        f"• The role is a special role (like @everyone)\n\n"
-        f"Please check my permissions and role hierarchy."
-    )
+    return _BOT_PERM_ERR_TMPL % (role_name,)
 
 class PermissionCheckError(Exception):
     """Custom exception for permission check failures."""
@@ -93,13 +120,17 @@ async def ensure_user_permissions(interaction: discord.Interaction, permission_t
         PermissionCheckError: If the user doesn't have the required permissions
     """
     if permission_type == "manage_roles":
-        has_permission = has_manage_roles_permission(interaction.user, interaction.guild)
+        check = _has_manage_roles_member
         perm_name = "Manage Roles or Administrator"
     elif permission_type == "shuffle":
-        has_permission = has_shuffle_permission(interaction.user, interaction.guild)
+        check = _has_shuffle_member
         perm_name = "Manage Roles or Administrator"
     else:
         raise ValueError(f"Unknown permission type: {permission_type}")
+
+    # interaction.user is only a plain User outside a server; inside one it is
+    # always a Member, so the guild check replaces a per-call isinstance check
+    has_permission = interaction.guild is not None and check(interaction.user, interaction.guild)
     
     if not has_permission:
         raise PermissionCheckError(format_permission_error(interaction.user, perm_name))
@@ -111,7 +142,7 @@ async def ensure_bot_can_manage_role(interaction: discord.Interaction, role: dis
     Raises:
         PermissionCheckError: If the bot can't manage the role
     """
-    bot_member = interaction.guild.get_member(interaction.client.user.id)
+    bot_member = interaction.guild.me  # The bot's own member object, kept by discord.py
     
     if not can_bot_manage_role(bot_member, role):
         raise PermissionCheckError(format_bot_permission_error(role.name))
\ No newline at end of file